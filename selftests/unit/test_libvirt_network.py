@@ -16,7 +16,10 @@ if os.path.isdir(os.path.join(basedir, "virttest")):
 
 from test_virsh import FakeVirshFactory
 
+from virttest import virsh
+from virttest.libvirt_xml import network_xml
 from virttest.libvirt_xml.network_xml import NetworkXML
+from virttest.libvirt_xml.xcepts import LibvirtXMLError
 
 # The output of virsh.net_list with only default net
 _DEFAULT_NET = (
@@ -38,7 +41,12 @@ class NetworkTestBase(unittest.TestCase):
     @staticmethod
     def _net_list(option="--all", **dargs):
         """Bogus net_list command"""
-        cmd = "virsh net-list --all"
+        cmd = "virsh net-list %s" % option
+        if "--name" in option:
+            names = ["default"]
+            if _net_state["active"] or _net_state["persistent"]:
+                names.append("unittest")
+            return CmdResult(cmd, "\n".join(names) + "\n")
         if not _net_state["active"] and not _net_state["persistent"]:
             test_net = ""
         else:
@@ -77,6 +85,11 @@ class NetworkTestBase(unittest.TestCase):
         _net_state["persistent"] = False
         _net_state["autostart"] = False
 
+    @staticmethod
+    def _net_create(xmlfile="unittest.xml", **dargs):
+        """Bogus net_create command"""
+        _net_state["active"] = True
+
     @staticmethod
     def _net_start(name="unittest", **dargs):
         """Bogus net_start command"""
@@ -98,15 +111,63 @@ class NetworkTestBase(unittest.TestCase):
         else:
             _net_state["autostart"] = False
 
+    @classmethod
+    def _batch(cls, commands, **dargs):
+        """Bogus batch command, runs the bogus commands above"""
+        for command in commands:
+            name, arg = command.split(None, 1)
+            getattr(cls, "_" + name.replace("-", "_"))(arg)
+        return CmdResult("virsh %s" % " ; ".join(commands))
+
+    @staticmethod
+    def _network_xml(name, uuid):
+        """Return minimal XML of network name with uuid"""
+        return "<network><name>%s</name><uuid>%s</uuid></network>" % (name, uuid)
+
+    def _fake_net_dumpxml(self, uuid=None, virsh_instance=None):
+        """
+        Replace net_dumpxml and net_dumpxml_batch, dumping _network_xml()
+
+        :param uuid: Callable returning the uuid of a network name,
+                     'uuid-<name>' by default
+        :param virsh_instance: Fake virsh to change, self.bogus_virsh by default
+        :return: List of the network names dumped so far
+        """
+        if uuid is None:
+            uuid = lambda name: "uuid-%s" % name
+        if virsh_instance is None:
+            virsh_instance = self.bogus_virsh
+        dumped = []
+
+        def _net_dumpxml(name, extra="", **dargs):
+            dumped.append(name)
+            xml = self._network_xml(name, uuid(name))
+            return CmdResult("virsh net-dumpxml %s %s" % (name, extra), xml)
+
+        def _net_dumpxml_batch(names, **dargs):
+            dumped.extend(names)
+            return dict((name, self._network_xml(name, uuid(name))) for name in names)
+
+        virsh_instance.__super_set__("net_dumpxml", _net_dumpxml)
+        virsh_instance.__super_set__("net_dumpxml_batch", _net_dumpxml_batch)
+        return dumped
+
     def setUp(self):
+        # Don't let results cached by other tests answer this one's queries
+        network_xml._NAMES_CACHE.clear()
+        NetworkXML.clear_uuid_cache()
         # Use defined virsh methods below
-        self.bogus_virsh = FakeVirshFactory(preserve=["net_state_dict"])
+        self.bogus_virsh = FakeVirshFactory(
+            preserve=["net_state_dict", "net_list_names"]
+        )
         self.bogus_virsh.__super_set__("net_list", self._net_list)
         self.bogus_virsh.__super_set__("net_define", self._net_define)
         self.bogus_virsh.__super_set__("net_undefine", self._net_undefine)
+        self.bogus_virsh.__super_set__("net_create", self._net_create)
         self.bogus_virsh.__super_set__("net_start", self._net_start)
         self.bogus_virsh.__super_set__("net_destroy", self._net_destroy)
         self.bogus_virsh.__super_set__("net_autostart", self._net_autostart)
+        self.bogus_virsh.__super_set__("batch", self._batch)
 
 
 class NetworkXMLTest(NetworkTestBase):
@@ -145,6 +206,333 @@ class NetworkXMLTest(NetworkTestBase):
             else:
                 self.assertEqual(state, new_state)
 
+    def test_sync_failure(self):
+        """
+        Unit test for sync of NetworkXML class failing part of its batch.
+        """
+
+        def _batch(commands, **dargs):
+            # net-start fails, the following net-autostart still succeeds
+            for command in commands:
+                if not command.startswith("net-start"):
+                    self._batch([command])
+            return CmdResult("virsh batch", stderr="error: net-start failed")
+
+        test_xml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        test_xml.orbital_nuclear_strike()
+        self.bogus_virsh.__super_set__("batch", _batch)
+        self.assertRaises(LibvirtXMLError, test_xml.sync)
+        self.bogus_virsh.__super_set__("batch", self._batch)
+        test_xml.orbital_nuclear_strike()
+
+    def test_undefine(self):
+        """
+        Unit test for undefine method of NetworkXML class.
+        """
+        batches = []
+
+        def _batch(commands, **dargs):
+            batches.append(list(commands))
+            return self._batch(commands, **dargs)
+
+        test_xml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        inactive = {"active": False, "persistent": True, "autostart": False}
+        undefine = "net-undefine unittest"
+        for state, commands in (
+            (None, ["net-destroy unittest", undefine]),
+            (inactive, [undefine]),
+        ):
+            test_xml.sync(state)
+            self.bogus_virsh.__super_set__("batch", _batch)
+            test_xml.undefine()
+            self.bogus_virsh.__super_set__("batch", self._batch)
+            self.assertEqual(batches.pop(), commands)
+            self.assertEqual(test_xml.state_dict(), None)
+
+    def test_new_all_networks_dict(self):
+        """
+        Unit test for new_all_networks_dict method of NetworkXML class.
+        """
+        self._fake_net_dumpxml()
+        networks = NetworkXML.new_all_networks_dict(self.bogus_virsh)
+        self.assertEqual(list(networks.keys()), ["default"])
+        self.assertEqual(networks["default"].name, "default")
+        self.assertEqual(networks["default"].uuid, "uuid-default")
+
+    def test_new_all_networks_dict_fast(self):
+        """
+        Unit test for new_all_networks_dict_fast method of NetworkXML class.
+        """
+        networks = NetworkXML.new_all_networks_dict_fast(
+            FakeConnection(), self.bogus_virsh
+        )
+        self.assertEqual(list(networks.keys()), ["default", "unittest"])
+        self.assertEqual(networks["unittest"].uuid, "bound-unittest")
+        self.assertIs(networks["unittest"].virsh, self.bogus_virsh)
+
+    def test_get_uuid_by_name(self):
+        """
+        Unit test for get_uuid_by_name method of NetworkXML class.
+        """
+        counter = itertools.count(1)
+        dumped = self._fake_net_dumpxml(lambda name: "uuid-%d" % next(counter))
+        for _ in range(2):
+            uuid = NetworkXML.get_uuid_by_name("unittest", self.bogus_virsh)
+            self.assertEqual(uuid, "uuid-1")
+        self.assertEqual(dumped, ["unittest"])
+        # Any change made through NetworkXML drops cached uuids
+        test_xml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        test_xml.sync()
+        uuid = NetworkXML.get_uuid_by_name("unittest", self.bogus_virsh)
+        self.assertEqual(uuid, "uuid-2")
+        test_xml.orbital_nuclear_strike()
+
+    def test_exists(self):
+        """
+        Unit test for exists method of NetworkXML class.
+        """
+        listed = []
+
+        def _net_list(option="--all", **dargs):
+            listed.append(option)
+            return CmdResult("virsh net-list %s" % option, "default\nunittest\n")
+
+        def _net_define(xmlfile, **dargs):
+            return CmdResult("virsh net-define %s" % xmlfile)
+
+        self.bogus_virsh.__super_set__("net_list", _net_list)
+        self.bogus_virsh.__super_set__("net_define", _net_define)
+        test_xml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        other_xml = NetworkXML(network_name="other", virsh_instance=self.bogus_virsh)
+        self.assertTrue(test_xml.exists())
+        self.assertFalse(other_xml.exists())
+        self.assertEqual(listed, ["--all --name"])
+        # Changes made through NetworkXML drop the cached names
+        other_xml.define()
+        self.assertFalse(other_xml.exists())
+        self.assertEqual(len(listed), 2)
+
+    def test_uuid_cache_size(self):
+        """
+        Unit test for the bounded uuid cache of get_uuid_by_name.
+        """
+        self._fake_net_dumpxml()
+        orig_size = network_xml.UUID_CACHE_SIZE
+        network_xml.UUID_CACHE_SIZE = 2
+        try:
+            for name in ("a", "b", "a", "c"):
+                NetworkXML.get_uuid_by_name(name, self.bogus_virsh)
+        finally:
+            network_xml.UUID_CACHE_SIZE = orig_size
+        # "a" was used after "b", so "b" is dropped
+        cached = sorted(key[1] for key in network_xml._UUID_CACHE)
+        self.assertEqual(cached, ["a", "c"])
+
+    def test_remote_cache_keys(self):
+        """
+        Unit test local and remote sessions without uri don't share caches.
+        """
+        remote_virsh = FakeVirshFactory(preserve=["net_state_dict", "net_list_names"])
+        remote_virsh.__super_set__("remote_ip", "192.0.2.1")
+        remote_virsh.__super_set__("remote_user", "root")
+
+        def _net_list(host_networks):
+            def _list(options, extra="", **dargs):
+                return CmdResult("virsh net-list", "\n".join(host_networks))
+
+            return _list
+
+        self.bogus_virsh["uri"] = remote_virsh["uri"] = None
+        self._fake_net_dumpxml(lambda name: "local-%s" % name)
+        self._fake_net_dumpxml(lambda name: "remote-%s" % name, remote_virsh)
+        self.bogus_virsh.__super_set__("net_list", _net_list(["default"]))
+        remote_virsh.__super_set__("net_list", _net_list(["remote-only"]))
+        self.assertNotEqual(
+            network_xml._connection_key(self.bogus_virsh),
+            network_xml._connection_key(remote_virsh),
+        )
+        self.assertEqual(
+            NetworkXML.get_uuid_by_name("default", self.bogus_virsh),
+            "local-default",
+        )
+        self.assertEqual(
+            NetworkXML.get_uuid_by_name("default", remote_virsh),
+            "remote-default",
+        )
+        for virsh_instance, exists in (
+            (self.bogus_virsh, True),
+            (remote_virsh, False),
+        ):
+            netxml = NetworkXML(virsh_instance=virsh_instance)
+            netxml.name = "default"
+            self.assertEqual(netxml.exists(), exists)
+
+
+class FakeLibvirtError(Exception):
+    """Bogus libvirt.libvirtError"""
+
+    def __init__(self, code):
+        super(FakeLibvirtError, self).__init__("bogus libvirt error %d" % code)
+        self.code = code
+
+    def get_error_code(self):
+        return self.code
+
+
+class FakeNetwork(object):
+    """Bogus libvirt.virNetwork"""
+
+    def __init__(self, name, active, autostart, persistent):
+        self._name = name
+        self.state = (active, autostart, persistent)
+
+    def name(self):
+        return self._name
+
+    def isActive(self):
+        return int(self.state[0])
+
+    def autostart(self):
+        return int(self.state[1])
+
+    def isPersistent(self):
+        return int(self.state[2])
+
+    def XMLDesc(self, flags):
+        xml = NetworkTestBase._network_xml(self._name, "bound-%s" % self._name)
+        return xml + "\n"
+
+
+class FakeConnection(object):
+    """Bogus libvirt.virConnect with a default and an unittest network"""
+
+    def __init__(self):
+        self.networks = [
+            FakeNetwork("unittest", False, True, True),
+            FakeNetwork("default", True, True, True),
+        ]
+        self.list_error = None
+
+    def isAlive(self):
+        return 1
+
+    def close(self):
+        pass
+
+    def listAllNetworks(self, flags=0):
+        if self.list_error is not None:
+            raise FakeLibvirtError(self.list_error)
+        return list(self.networks)
+
+    def networkLookupByName(self, name):
+        for network in self.networks:
+            if network.name() == name:
+                return network
+        raise FakeLibvirtError(FakeLibvirt.VIR_ERR_NO_NETWORK)
+
+
+class FakeLibvirt(object):
+    """Bogus libvirt module"""
+
+    VIR_ERR_NO_NETWORK = 43
+    VIR_ERR_INTERNAL_ERROR = 1
+    libvirtError = FakeLibvirtError
+
+    def __init__(self):
+        self.opened = []
+        self.conn = FakeConnection()
+
+    def openReadOnly(self, uri):
+        self.opened.append(uri)
+        if self.conn is None:
+            raise FakeLibvirtError(FakeLibvirt.VIR_ERR_INTERNAL_ERROR)
+        return self.conn
+
+
+class LibvirtBindingsTest(NetworkTestBase):
+    """
+    Unit test class for NetworkXML queries through libvirt python bindings.
+    """
+
+    def setUp(self):
+        super(LibvirtBindingsTest, self).setUp()
+        # Bindings are only used for the plain local virsh
+        self.bogus_virsh["virsh_exec"] = virsh.VIRSH_EXEC
+        self.fake_libvirt = FakeLibvirt()
+        self.orig_libvirt = network_xml.libvirt
+        network_xml.libvirt = self.fake_libvirt
+        network_xml.USE_LIBVIRT_BINDINGS = True
+        network_xml.close_libvirt_connections()
+
+    def tearDown(self):
+        network_xml.close_libvirt_connections()
+        network_xml.USE_LIBVIRT_BINDINGS = False
+        network_xml.libvirt = self.orig_libvirt
+
+    def test_state_dict(self):
+        netxml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        state = {"active": False, "autostart": True, "persistent": True}
+        self.assertEqual(netxml.state_dict(), state)
+        self.assertTrue(netxml.defined)
+        missing = NetworkXML(network_name="missing", virsh_instance=self.bogus_virsh)
+        self.assertEqual(missing.state_dict(), None)
+        # One read-only connection, reused. FakeLibvirt has no
+        # registerErrorHandler(), the global handler must be left alone.
+        self.assertEqual(self.fake_libvirt.opened, ["qemu:///system"])
+
+    def test_opt_in(self):
+        network_xml.USE_LIBVIRT_BINDINGS = False
+        netxml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        netxml.state_dict()  # Answered by the bogus net_list command
+        self.assertEqual(self.fake_libvirt.opened, [])
+
+    def test_failed_open_remembered(self):
+        self.fake_libvirt.conn = None
+        netxml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        for _ in range(2):
+            # Bogus net_list command answers
+            netxml.state_dict()
+        self.assertEqual(self.fake_libvirt.opened, ["qemu:///system"])
+        orig_interval = network_xml.LIBVIRT_RETRY_INTERVAL
+        network_xml.LIBVIRT_RETRY_INTERVAL = 0
+        try:
+            netxml.state_dict()
+        finally:
+            network_xml.LIBVIRT_RETRY_INTERVAL = orig_interval
+        self.assertEqual(len(self.fake_libvirt.opened), 2)
+
+    def test_exists(self):
+        netxml = NetworkXML(network_name="unittest", virsh_instance=self.bogus_virsh)
+        missing = NetworkXML(network_name="missing", virsh_instance=self.bogus_virsh)
+        self.assertTrue(netxml.exists())
+        self.assertFalse(missing.exists())
+        key = network_xml._connection_key(self.bogus_virsh)
+        self.assertEqual(
+            network_xml._NAMES_CACHE[key][1], frozenset(["unittest", "default"])
+        )
+        # Errors fall back to the bogus net_list command
+        self.fake_libvirt.conn.list_error = FakeLibvirt.VIR_ERR_INTERNAL_ERROR
+        network_xml._NAMES_CACHE.clear()
+        self.assertFalse(missing.exists())
+        self.assertIn(key, network_xml._NAMES_CACHE)
+
+    def test_new_from_net_dumpxml(self):
+        netxml = NetworkXML.new_from_net_dumpxml("default", self.bogus_virsh)
+        self.assertEqual(netxml.uuid, "bound-default")
+        # Lookup errors and extra options fall back to virsh
+        self._fake_net_dumpxml(lambda name: "dumped")
+        netxml = NetworkXML.new_from_net_dumpxml("missing", self.bogus_virsh)
+        self.assertEqual(netxml.uuid, "dumped")
+        netxml = NetworkXML.new_from_net_dumpxml(
+            "default", self.bogus_virsh, "--inactive"
+        )
+        self.assertEqual(netxml.uuid, "dumped")
+
+    def test_new_all_networks_dict(self):
+        networks = NetworkXML.new_all_networks_dict(self.bogus_virsh)
+        self.assertEqual(list(networks.keys()), ["default", "unittest"])
+        self.assertEqual(networks["unittest"].uuid, "bound-unittest")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,6 @@
 #!/usr/bin/python
 
+import ipaddress
 import logging
 import os
 import shutil
@@ -548,6 +549,45 @@ class AccessorsTest(LibvirtXMLTestBase):
         self.assertEqual(test[1].secret_sauce, "None")
         self.assertEqual(test[2].secret_sauce, "None")
 
+    def test_XMLElementList_marshal_tags(self):
+        seen = []
+
+        def to_it(tag, attrs, index, lvxml):
+            seen.append((tag, index))
+            return attrs.get("secret_sauce")
+
+        def from_it(item, index, lvxml):
+            return ("whatchamacallit", {"secret_sauce": item})
+
+        class Foo(base.LibvirtXMLBase):
+            __slots__ = ("bar",)
+
+            def __init__(self, virsh_instance):
+                accessors.XMLElementList(
+                    "bar",
+                    self,
+                    parent_xpath="/bar",
+                    marshal_from=from_it,
+                    marshal_to=to_it,
+                    marshal_tags=("whatchamacallit",),
+                )
+                # pylint: disable=E1003
+                super(Foo, self).__init__(virsh_instance=virsh_instance)
+                self.xml = """<foo><bar>
+                                  <notone secret_sauce='snafu'/>
+                                  <whatchamacallit secret_sauce='foobar'/>
+                              </bar></foo>"""
+
+        foo = Foo(virsh_instance=self.dummy_virsh)
+        self.assertEqual(foo.bar, ["foobar"])
+        self.assertEqual(seen, [("whatchamacallit", 1)])
+        del seen[:]
+        foo.bar = ["5"]
+        self.assertEqual(seen, [("whatchamacallit", 1)])
+        test_xtf = xml_utils.XMLTreeFile(foo.xml)
+        self.assertEqual(test_xtf.find("bar/notone").get("secret_sauce"), "snafu")
+        self.assertEqual(test_xtf.find("bar/whatchamacallit").get("secret_sauce"), "5")
+
     def test_XMLElementList_Text(self):
         class Whatchamacallit(base.LibvirtXMLBase):
             __slots__ = ("text",)
@@ -761,6 +801,78 @@ class testNetworkXML(LibvirtXMLTestBase):
         self.assertEqual(ipxml.address, "address_test")
         self.assertEqual(ipxml.netmask, "netmask_test")
 
+    def test_batch_writes(self):
+        netxml = self._from_scratch()
+        with netxml.batch_writes():
+            netxml.name = "test5"
+            netxml.uuid = "test6"
+            with open(netxml.xml) as xml_file:
+                self.assertNotIn("test5", xml_file.read())
+            # Copies of the tree still see pending changes
+            self.assertEqual(netxml.ips[0].address, "address_test")
+            self.assertEqual(netxml.copy().name, "test5")
+        test_xtf = xml_utils.XMLTreeFile(netxml.xml)  # re-parse from filename
+        self.assertEqual(test_xtf.find("name").text, "test5")
+        self.assertEqual(test_xtf.find("uuid").text, "test6")
+
+    def test_add_ips(self):
+        netxml = self._from_scratch()
+        netxml.add_ips(
+            [network_xml.IPXML("192.168.100.1"), network_xml.IPXML("192.168.101.1")]
+        )
+        addresses = [ipxml.address for ipxml in netxml.ips]
+        self.assertEqual(addresses, ["address_test", "192.168.100.1", "192.168.101.1"])
+        self.assertRaises(xcepts.LibvirtXMLError, netxml.add_ips, [{}])
+
+    def test_ip_init(self):
+        ipxml = network_xml.IPXML("192.168.100.1", "255.255.0.0")
+        self.assertEqual(ipxml.address, "192.168.100.1")
+        self.assertEqual(ipxml.netmask, "255.255.0.0")
+        ipxml = network_xml.IPXML("2001:db8::1", ipv6=True)
+        test_xtf = xml_utils.XMLTreeFile(ipxml.xml)  # re-parse from filename
+        self.assertEqual(test_xtf.getroot().get("address"), "2001:db8::1")
+        self.assertEqual(test_xtf.getroot().get("netmask"), None)
+
+    def test_ip_init_non_str(self):
+        ipxml = network_xml.IPXML(ipaddress.ip_address("10.0.0.1"), 24)
+        self.assertEqual(ipxml.address, "10.0.0.1")
+        self.assertEqual(ipxml.netmask, "24")
+        test_xtf = xml_utils.XMLTreeFile(ipxml.xml)  # re-parse from filename
+        self.assertEqual(test_xtf.getroot().get("netmask"), "24")
+        element = xml_utils.ElementTree.Element("ip", {"netmask": 24})
+        self.assertRaises(TypeError, xml_utils.XMLTreeFile, element)
+
+    def test_dhcp_ranges_fast(self):
+        ipxml = network_xml.IPXML()
+        ranges = [
+            ("192.168.122.2", "192.168.122.9"),
+            ("192.168.122.20", "192.168.122.29"),
+        ]
+        ipxml.set_dhcp_ranges_fast(ranges)
+        ipxml.set_dhcp_ranges_fast(ranges[1:])
+        test_xtf = xml_utils.XMLTreeFile(ipxml.xml)  # re-parse from filename
+        elements = test_xtf.findall("dhcp/range")
+        self.assertEqual(len(elements), 1)
+        self.assertEqual(elements[0].get("start"), "192.168.122.20")
+        self.assertEqual(elements[0].get("end"), "192.168.122.29")
+
+    def test_dhcp_ranges_fast_order(self):
+        ipxml = network_xml.IPXML()
+        host = network_xml.DhcpHostXML()
+        host.attrs = {"mac": "00:16:3e:77:e2:ed", "ip": "192.168.122.10"}
+        ipxml.hosts = [host]
+        ipxml.dhcp_bootp = "/pxelinux.0"
+        ranges = [("192.168.122.2", "192.168.122.9")]
+        ipxml.set_dhcp_ranges_fast(ranges)
+        test_xtf = xml_utils.XMLTreeFile(ipxml.xml)  # re-parse from filename
+        tags = [element.tag for element in test_xtf.find("dhcp")]
+        self.assertEqual(tags, ["range", "host", "bootp"])
+        # Replaced ranges keep their place
+        ipxml.set_dhcp_ranges_fast(ranges * 2)
+        test_xtf = xml_utils.XMLTreeFile(ipxml.xml)
+        tags = [element.tag for element in test_xtf.find("dhcp")]
+        self.assertEqual(tags, ["range", "range", "host", "bootp"])
+
 
 class testLibrarian(LibvirtXMLTestBase):
     def test_bad_names(self):
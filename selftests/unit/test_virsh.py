@@ -2,7 +2,10 @@
 
 import logging
 import os
+import subprocess
 import sys
+import threading
+import time
 import unittest
 
 from avocado.utils import process
@@ -221,6 +224,152 @@ class ConstructorsTest(ModuleLoad):
         del vc  # keep pylint happy
 
 
+class CommandStubTest(ModuleLoad):
+    """
+    Base for tests of functions built on virsh.command(), which is stubbed
+    to record the command lines and return canned output.
+    """
+
+    def setUp(self):
+        self.commands = []
+        self.outputs = {}
+        self.orig_command = self.virsh.command
+        self.virsh.command = self.fake_command
+
+    def tearDown(self):
+        self.virsh.command = self.orig_command
+
+    def fake_command(self, cmd, **dargs):
+        self.commands.append(cmd)
+        stdout, exit_status = self.outputs.get(cmd, ("", 0))
+        return process.CmdResult(cmd, stdout, "", exit_status)
+
+
+class BatchTest(CommandStubTest):
+    def test_batch(self):
+        self.virsh.batch(["net-start a", "net-autostart a"])
+        self.assertEqual(self.commands, ['"net-start a ; net-autostart a"'])
+
+    def test_batch_quoting(self):
+        self.virsh.batch(['net-dumpxml a "b" $HOME `id` \\'])
+        self.assertEqual(
+            self.commands, ['"net-dumpxml a \\"b\\" \\$HOME \\`id\\` \\\\"']
+        )
+        # Arrives unchanged through the shell
+        # (subprocess, other test modules replace process.run)
+        output = subprocess.check_output("echo %s" % self.commands[0], shell=True)
+        self.assertEqual(output.decode().strip(), 'net-dumpxml a "b" $HOME `id` \\')
+
+    def test_batch_session(self):
+        # Interactive sessions get the commands without shell quoting
+        self.virsh.batch(["net-start a", "net-autostart a"], session_id="x")
+        self.assertEqual(self.commands, ["net-start a ; net-autostart a"])
+
+
+class NetDumpxmlBatchTest(CommandStubTest):
+    batch_cmd = (
+        '"echo @net-dumpxml@ a ; net-dumpxml a  ; '
+        "echo @net-dumpxml@ b ; net-dumpxml b  ; "
+        'echo @net-dumpxml@ c ; net-dumpxml c "'
+    )
+
+    def test_batch_output(self):
+        self.outputs[self.batch_cmd] = (
+            "@net-dumpxml@ a\n<network>\n  <name>a</name>\n</network>\n\n"
+            "@net-dumpxml@ b\n<network><name>b</name></network>\n"
+            "@net-dumpxml@ c\n<network><name>c</name></network>\n",
+            0,
+        )
+        result = self.virsh.net_dumpxml_batch(["a", "b", "c"])
+        self.assertEqual(
+            result,
+            {
+                "a": "<network>\n  <name>a</name>\n</network>",
+                "b": "<network><name>b</name></network>",
+                "c": "<network><name>c</name></network>",
+            },
+        )
+        self.assertEqual(self.commands, [self.batch_cmd])
+
+    def test_missing_output_retried(self):
+        # b failed in the batch and c never ran
+        self.outputs[self.batch_cmd] = (
+            "@net-dumpxml@ a\n<network><name>a</name></network>\n@net-dumpxml@ b\n",
+            1,
+        )
+        for name in "bc":
+            xml = "<network><name>%s</name></network>\n" % name
+            self.outputs["net-dumpxml %s " % name] = (xml, 0)
+        result = self.virsh.net_dumpxml_batch(["a", "b", "c"])
+        self.assertEqual(result["a"], "<network><name>a</name></network>")
+        self.assertEqual(result["b"], "<network><name>b</name></network>")
+        self.assertEqual(result["c"], "<network><name>c</name></network>")
+        self.assertEqual(self.commands[0], self.batch_cmd)
+        self.assertEqual(
+            sorted(self.commands[1:]), ["net-dumpxml b ", "net-dumpxml c "]
+        )
+
+    def dump_concurrently(self, workers):
+        """Dump four networks missing from the batch, return the thread count"""
+        threads = set()
+        lock = threading.Lock()
+        orig_workers = os.environ.get("VIRSH_DUMPXML_WORKERS")
+        if workers is None:
+            os.environ.pop("VIRSH_DUMPXML_WORKERS", None)
+        else:
+            os.environ["VIRSH_DUMPXML_WORKERS"] = workers
+
+        def slow_command(cmd, **dargs):
+            if cmd.startswith("net-dumpxml"):
+                with lock:
+                    threads.add(threading.current_thread().name)
+                time.sleep(0.05)  # Let the other workers pick up names
+            return self.fake_command(cmd, **dargs)
+
+        self.virsh.command = slow_command
+        try:
+            result = self.virsh.net_dumpxml_batch(["a", "b", "c", "d"])
+        finally:
+            if orig_workers is None:
+                os.environ.pop("VIRSH_DUMPXML_WORKERS", None)
+            else:
+                os.environ["VIRSH_DUMPXML_WORKERS"] = orig_workers
+        self.assertEqual(sorted(result.keys()), ["a", "b", "c", "d"])
+        return len(threads)
+
+    def test_concurrent_retries(self):
+        self.assertEqual(self.dump_concurrently(None), 4)
+        self.assertEqual(self.dump_concurrently("2"), 2)
+        self.assertEqual(self.dump_concurrently("1"), 1)
+
+    def test_invalid_workers(self):
+        # Falls back to the default worker count
+        self.assertEqual(self.dump_concurrently("many"), 4)
+
+    def test_no_names(self):
+        self.assertEqual(self.virsh.net_dumpxml_batch([]), {})
+        self.assertEqual(self.commands, [])
+
+
+class NetListNamesTest(CommandStubTest):
+    def test_names(self):
+        self.outputs["net-list --all --name "] = ("default\nunittest\n\n", 0)
+        self.assertEqual(self.virsh.net_list_names(), ["default", "unittest"])
+        self.assertEqual(self.commands, ["net-list --all --name "])
+
+    def test_state_dict_fallback(self):
+        # virsh without --name support
+        self.outputs["net-list --all --name "] = ("", 1)
+        self.outputs["net-list --all "] = (
+            " Name      State    Autostart   Persistent\n"
+            "--------------------------------------------\n"
+            " default   active   yes         yes\n",
+            0,
+        )
+        self.assertEqual(self.virsh.net_list_names(), ["default"])
+        self.assertEqual(self.commands, ["net-list --all --name ", "net-list --all "])
+
+
 # Ensure the following tests ONLY run if a valid virsh command exists #####
 class ModuleLoadCheckVirsh(unittest.TestCase):
     from virttest import virsh
@@ -111,18 +111,22 @@ class AccessorBase(PropCanBase):
             and parent_element.tag == tag_name
         ) and nested is False:
             return parent_element
-        excpt_str = (
-            'Exception thrown from %s for property "%s" while'
-            ' looking for element tag "%s", on parent at xpath'
-            ' "%s", in XML\n%s\n'
-            % (
-                self.operation,
-                self.property_name,
-                tag_name,
-                parent_xpath,
-                str(self.xmltreefile()),
+
+        def excpt_str():
+            # Only serialize the whole XML when there is an error to report
+            return (
+                'Exception thrown from %s for property "%s" while'
+                ' looking for element tag "%s", on parent at xpath'
+                ' "%s", in XML\n%s\n'
+                % (
+                    self.operation,
+                    self.property_name,
+                    tag_name,
+                    parent_xpath,
+                    str(self.xmltreefile()),
+                )
             )
-        )
+
         if parent_element is None:
             if create:
                 # This will only work for simple XPath strings
@@ -130,11 +134,11 @@ class AccessorBase(PropCanBase):
                 parent_element = self.xmltreefile().find(parent_xpath)
             # if create or not, raise if not exist
             if parent_element is None:
-                raise xcepts.LibvirtXMLAccessorError(excpt_str)
+                raise xcepts.LibvirtXMLAccessorError(excpt_str())
         try:
             element = parent_element.find(tag_name)
         except Exception:
-            logging.error(excpt_str)
+            logging.error(excpt_str())
             raise
         if element is None:
             if create:  # Create the element
@@ -765,6 +769,7 @@ class XMLElementList(AccessorGeneratorBase):
         marshal_from=None,
         marshal_to=None,
         has_subclass=None,
+        marshal_tags=None,
     ):
         """
         Create undefined accessors on libvirt instance
@@ -780,6 +785,10 @@ class XMLElementList(AccessorGeneratorBase):
         :param marshal_to: Callable. Passed a the item tag, attribute-dict, index,
                             libvirtxml, and optional text instance.  Returns
                             item value accepted by marshal_from or None to skip
+        :param marshal_tags: Optional collection of the only child tags
+                             marshal_to converts. Other children are skipped
+                             as if marshal_to returned None, without first
+                             being converted to its input format.
         """
         if not callable(marshal_from) or not callable(marshal_to):
             raise ValueError("Both marshal_from and marshal_to must be " "callable")
@@ -791,6 +800,7 @@ class XMLElementList(AccessorGeneratorBase):
             marshal_from=marshal_from,
             marshal_to=marshal_to,
             has_subclass=has_subclass,
+            marshal_tags=marshal_tags,
         )
 
     class Getter(AccessorBase):
@@ -798,7 +808,9 @@ class XMLElementList(AccessorGeneratorBase):
         Retrieve list of values as returned by the marshal_to callable
         """
 
-        __slots__ = add_to_slots("parent_xpath", "marshal_to", "has_subclass")
+        __slots__ = add_to_slots(
+            "parent_xpath", "marshal_to", "has_subclass", "marshal_tags"
+        )
 
         def __call__(self):
             # Parent structure cannot be pre-determined as in other classes
@@ -816,6 +828,9 @@ class XMLElementList(AccessorGeneratorBase):
             # index numbers to filter/skip certain elements
             # but also support specific item ordering.
             for child in list(parent):
+                if self.marshal_tags is not None and child.tag not in self.marshal_tags:
+                    index += 1  # Always use absolute index
+                    continue
                 # Call user-defined helper to translate Element
                 # into simple pre-defined format.
 
@@ -904,7 +919,9 @@ class XMLElementList(AccessorGeneratorBase):
         Remove ALL child elements for which marshal_to does NOT return None
         """
 
-        __slots__ = add_to_slots("parent_xpath", "marshal_to", "has_subclass")
+        __slots__ = add_to_slots(
+            "parent_xpath", "marshal_to", "has_subclass", "marshal_tags"
+        )
 
         def __call__(self):
             parent = self.xmltreefile().find(self.parent_xpath)
@@ -916,6 +933,9 @@ class XMLElementList(AccessorGeneratorBase):
             todel = []
             index = 0
             for child in list(parent):
+                if self.marshal_tags is not None and child.tag not in self.marshal_tags:
+                    index += 1  # Always use absolute index
+                    continue
                 # To support directly deleting xml elements xml objects,
                 # first create xmltreefile for new object
                 if self.has_subclass:
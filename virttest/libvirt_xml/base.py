@@ -1,3 +1,4 @@
+import contextlib
 import logging
 
 from avocado.utils import process
@@ -129,7 +130,7 @@ class LibvirtXMLBase(propcan.PropCanBase):
                     del self["xml"]  # clean up old temporary files
             except KeyError:
                 pass  # Allow other exceptions through
-            # value could be filename or a string full of XML
+            # value could be filename, a string full of XML or an Element
             self.__dict_set__("xml", xml_utils.XMLTreeFile(value))
 
     def get_xml(self):
@@ -241,6 +242,25 @@ class LibvirtXMLBase(propcan.PropCanBase):
         cmdresult.stderr = cmdresult.stderr_text
         return cmdresult
 
+    @contextlib.contextmanager
+    def batch_writes(self):
+        """
+        Write the backing XML file only once for all changes within the block
+
+        Changes are kept in the in-memory tree, so code inside the block
+        must not read the XML file by name (e.g. pass self.xml to virsh).
+        Nothing is deferred while no xml has been loaded yet.
+        """
+        try:
+            xmltreefile = self.__dict_get__("xml")
+        except KeyError:
+            xmltreefile = None
+        if not isinstance(xmltreefile, xml_utils.XMLTreeFile):
+            yield
+            return
+        with xmltreefile.deferred_writes():
+            yield
+
     def setup_attrs(self, **attrs):
         """
         Setup attributes of an xml object
@@ -296,51 +316,53 @@ class LibvirtXMLBase(propcan.PropCanBase):
 
         'node' is removed.
         """
-
-        for key, value in attrs.items():
-            if key not in self.__all_slots__:
-                raise AttributeError(
-                    'Cannot set attribute "%s" to %s object.'
-                    "There is no such attribute." % (key, self.__class__)
-                )
-
-            # Delete attribute if the value is explicitly set to None
-            if value is None:
-                del_func = eval("self.del_%s" % key)
-                if not isinstance(del_func, propcan.PropCanBase):
-                    logging.warning(f"Customized del func {del_func} might not work")
-                del_func()
-                continue
-
-            get_func = eval("self.get_%s" % key)
-
-            # Skip Getters if they are customized
-            if not isinstance(get_func, propcan.PropCanBase):
-                continue
-
-            # Is XMLElementNest or not
-            subclass = get_func.get("subclass")
-            if subclass is None:
-                setattr(self, key, value)
-            else:
-                # Whether to keep the sub-xml instance and modify it
-                # or completely re-create one
-                reset_all = value.get("reset_all") is True
-                if "reset_all" in value:
-                    value.pop("reset_all")
-                # If Element tag is not found, we need to create a new instance
-                # to set the attributes.
-                # If reset_all, it means we will discard the existing instance
-                # of current sub-xml and create a new one to replace it.
-                if reset_all or self.xmltreefile.find(key) is None:
-                    # Get args to create an instance of subclass
-                    subclass_dargs = get_func.get("subclass_dargs")
-                    # Create an instance of subclass with given args
-                    target_obj = subclass(**subclass_dargs)
+        with self.batch_writes():
+            for key, value in attrs.items():
+                if key not in self.__all_slots__:
+                    raise AttributeError(
+                        'Cannot set attribute "%s" to %s object.'
+                        "There is no such attribute." % (key, self.__class__)
+                    )
+
+                # Delete attribute if the value is explicitly set to None
+                if value is None:
+                    del_func = eval("self.del_%s" % key)
+                    if not isinstance(del_func, propcan.PropCanBase):
+                        logging.warning(
+                            f"Customized del func {del_func} might not work"
+                        )
+                    del_func()
+                    continue
+
+                get_func = eval("self.get_%s" % key)
+
+                # Skip Getters if they are customized
+                if not isinstance(get_func, propcan.PropCanBase):
+                    continue
+
+                # Is XMLElementNest or not
+                subclass = get_func.get("subclass")
+                if subclass is None:
+                    setattr(self, key, value)
                 else:
-                    target_obj = get_func()
-                target_obj.setup_attrs(**value)
-                setattr(self, key, target_obj)
+                    # Whether to keep the sub-xml instance and modify it
+                    # or completely re-create one
+                    reset_all = value.get("reset_all") is True
+                    if "reset_all" in value:
+                        value.pop("reset_all")
+                    # If Element tag is not found, we need to create a new instance
+                    # to set the attributes.
+                    # If reset_all, it means we will discard the existing instance
+                    # of current sub-xml and create a new one to replace it.
+                    if reset_all or self.xmltreefile.find(key) is None:
+                        # Get args to create an instance of subclass
+                        subclass_dargs = get_func.get("subclass_dargs")
+                        # Create an instance of subclass with given args
+                        target_obj = subclass(**subclass_dargs)
+                    else:
+                        target_obj = get_func()
+                    target_obj.setup_attrs(**value)
+                    setattr(self, key, target_obj)
 
     def fetch_attrs(self):
         """
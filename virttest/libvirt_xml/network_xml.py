@@ -3,14 +3,218 @@ Module simplifying manipulation of XML described at
 http://libvirt.org/formatnetwork.html
 """
 
+import contextlib
+import io
 import logging
+import time
 
 from virttest import xml_utils
 from virttest.libvirt_xml import accessors, base, xcepts
 from virttest.libvirt_xml.devices import librarian
 
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
 LOG = logging.getLogger("avocado." + __name__)
 
+# Use libvirt python bindings, when installed, instead of starting virsh
+# for read-only network queries, see _libvirt_conn(). The process-wide
+# libvirt error handler is left alone: queries avoid lookups which fail in
+# normal use (exists() lists names instead), so only unexpected errors are
+# printed by it before virsh is tried.
+USE_LIBVIRT_BINDINGS = False
+
+# Seconds before opening a libvirt connection which failed is tried again
+LIBVIRT_RETRY_INTERVAL = 10.0
+
+# uri to its read-only libvirt connection, or to the time opening it failed
+_LIBVIRT_CONNS = {}
+
+# XMLElementList accessors already hand marshal_to a fresh attribute dict
+# and SubElement() copies the one returned by marshal_from, so copying it
+# again in the marshal functions is only needed to protect callers relying
+# on the old behavior.
+COPY_MARSHAL_DICTS = False
+
+# (connection, network name) to uuid, see NetworkXML.get_uuid_by_name()
+_UUID_CACHE = {}
+
+# Most uuids kept in _UUID_CACHE, the least recently used are dropped first
+UUID_CACHE_SIZE = 512
+
+# connection to (timestamp, frozenset of network names), see NetworkXML.exists()
+_NAMES_CACHE = {}
+
+# Seconds a cached network name list is trusted for networks changed
+# outside of NetworkXML
+NAMES_CACHE_TTL = 1.0
+
+
+def _marshal_dict(attr_dict):
+    """
+    Return attr_dict, or a copy of it when COPY_MARSHAL_DICTS is set
+    """
+    if COPY_MARSHAL_DICTS:
+        return dict(attr_dict)
+    return attr_dict
+
+
+def _connection_key(virsh_instance):
+    """
+    Return cache key for virsh_instance's connection
+
+    Instances connecting to the same uri as the same user from the same
+    host share cached results; without uri they use the default connection
+    of the host virsh runs on, local or remote (VirshPersistent remote_ip).
+    """
+    uri = getattr(virsh_instance, "uri", None) or "default"
+    return (
+        uri,
+        getattr(virsh_instance, "unprivileged_user", None),
+        getattr(virsh_instance, "remote_ip", None),
+        getattr(virsh_instance, "remote_user", None),
+    )
+
+
+def _uuid_cache_key(network_name, virsh_instance):
+    """
+    Return _UUID_CACHE key for network_name on virsh_instance's connection
+    """
+    return (_connection_key(virsh_instance), network_name)
+
+
+def _libvirt_conn(virsh_instance):
+    """
+    Return a reused read-only libvirt connection to virsh_instance's uri
+
+    Read-only queries use it to skip starting a virsh process per call.
+    Returns None unless USE_LIBVIRT_BINDINGS is set and the bindings are
+    installed, when connecting failed less than LIBVIRT_RETRY_INTERVAL
+    ago, or when virsh_instance doesn't run the local virsh directly
+    (persistent or unprivileged sessions, replaced virsh executable), so
+    callers fall back to virsh.
+    """
+    if libvirt is None or not USE_LIBVIRT_BINDINGS:
+        return None
+    if getattr(virsh_instance, "session_id", None):
+        return None
+    if getattr(virsh_instance, "unprivileged_user", None):
+        return None
+    virsh_exec = getattr(virsh_instance, "virsh_exec", base.virsh.VIRSH_EXEC)
+    if virsh_exec != base.virsh.VIRSH_EXEC:
+        return None
+    uri = getattr(virsh_instance, "uri", None)
+    conn = _LIBVIRT_CONNS.get(uri)
+    if isinstance(conn, float):
+        if time.monotonic() - conn < LIBVIRT_RETRY_INTERVAL:
+            return None
+        conn = None
+    try:
+        # e.g. libvirtd restarted by a test since last use
+        if conn is None or not conn.isAlive():
+            conn = _LIBVIRT_CONNS[uri] = libvirt.openReadOnly(uri)
+    except libvirt.libvirtError as detail:
+        LOG.debug("Using virsh, libvirt connection failed: %s", detail)
+        _LIBVIRT_CONNS[uri] = time.monotonic()
+        return None
+    return conn
+
+
+def close_libvirt_connections():
+    """
+    Close libvirt connections opened for network queries
+
+    They are opened again when needed.
+    """
+    for conn in _LIBVIRT_CONNS.values():
+        if isinstance(conn, float):
+            continue
+        try:
+            conn.close()
+        except libvirt.libvirtError:
+            pass  # Connection already broken
+    _LIBVIRT_CONNS.clear()
+
+
+def _libvirt_net_state_dict(conn, only_names=False):
+    """
+    Return the same mapping as virsh.net_state_dict() from libvirt bindings
+
+    :param conn: Connection returned by _libvirt_conn()
+    :param only_names: When true, return network names as keys and None values
+    """
+    result = {}
+    for net in conn.listAllNetworks():
+        if only_names:
+            result[net.name()] = None
+            continue
+        result[net.name()] = {
+            "active": bool(net.isActive()),
+            "autostart": bool(net.autostart()),
+            "persistent": bool(net.isPersistent()),
+        }
+    return result
+
+
+def _relative_xpath(xpath):
+    """
+    Return xpath in the root-relative form expected by ElementTree.findall
+
+    ElementPath caches compiled expressions itself, but an absolute path
+    like '/forward/interface' triggers a FutureWarning on every findall().
+    """
+    if xpath[:1] == "/":
+        return "." + xpath
+    return xpath
+
+
+def _scan_tag(xml, tag):
+    """
+    Return text of the first tag element right under the root of xml
+
+    Parsing stops at that element instead of building the whole tree.
+
+    :param xml: String containing XML
+    :param tag: Tag name of a child element of the root
+    :return: Element text or None if there is no such element
+    """
+    depth = 0
+    for event, element in xml_utils.ElementTree.iterparse(
+        io.StringIO(xml), events=("start", "end")
+    ):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            if element.tag == tag:
+                return element.text
+            element.clear()  # Done with this child and its subtree
+    return None
+
+
+def _net_dumpxml(network_name, virsh_instance, extra=""):
+    """
+    Return XML string of network_name, from libvirt bindings if possible
+
+    :param network_name: Name of network to net-dumpxml
+    :param virsh_instance: virsh module or instance to use
+    :param extra: Extra parameters to pass to net-dumpxml command
+    """
+    conn = _libvirt_conn(virsh_instance)
+    if conn is not None and not extra:
+        try:
+            net = conn.networkLookupByName(network_name)
+            return net.XMLDesc(0).rstrip()
+        except libvirt.libvirtError:
+            pass  # Let virsh report the problem
+    dump_result = virsh_instance.net_dumpxml(network_name, extra)
+    # Only trailing newline to drop, dumped XML has no declaration which
+    # leading whitespace would upset
+    return dump_result.stdout_text.rstrip()
+
 
 class RangeList(list):
     """
@@ -22,25 +226,25 @@ class RangeList(list):
         Initialize from list/tuple of two-item tuple start/end address strings
         """
         x_str = "iterable must contain two-item tuples of start/end addresses"
-        newone = []
-        for item in iterable:
-            if not issubclass(type(item), tuple):
-                raise xcepts.LibvirtXMLError(x_str)
-            if len(item) != 2:
-                raise xcepts.LibvirtXMLError(x_str)
-            # Assume strings will be validated elsewhere
-            newone.append(tuple(item))
-        super(RangeList, self).__init__(newone)
+
+        def _validated(items):
+            for item in items:
+                if not isinstance(item, tuple) or len(item) != 2:
+                    raise xcepts.LibvirtXMLError(x_str)
+                # Assume strings will be validated elsewhere
+                yield item
+
+        super(RangeList, self).__init__(_validated(iterable))
 
     def append_to_element(self, element):
         """
         Adds range described by instance to ElementTree.element
         """
-        if not issubclass(type(element), xml_utils.ElementTree.Element):
+        if not isinstance(element, xml_utils.ElementTree.Element):
             raise ValueError("Element is not a ElementTree.Element or subclass")
         for start, end in self:
             serange = {"start": start, "end": end}
-            element.append(xml_utils.ElementTree.Element("range", serange))
+            xml_utils.ElementTree.SubElement(element, "range", serange)
 
 
 # Sub-element of ip/dhcp
@@ -56,7 +260,7 @@ class RangeXML(base.LibvirtXMLBase):
             "lease_attrs", self, parent_xpath="/", tag_name="lease"
         )
         super(RangeXML, self).__init__(virsh_instance=virsh_instance)
-        self.xml = "<range/>"
+        self.xml = xml_utils.ElementTree.Element("range")
 
 
 class IPXML(base.LibvirtXMLBase):
@@ -124,19 +328,24 @@ class IPXML(base.LibvirtXMLBase):
             marshal_from=self.marshal_from_hosts,
             marshal_to=self.marshal_to_hosts,
             has_subclass=True,
+            marshal_tags=("host",),
         )
         super(IPXML, self).__init__(virsh_instance=virsh_instance)
-        if ipv6:
-            self.xml = "<ip address='%s'></ip>" % address
-        else:
-            self.xml = "<ip address='%s' netmask='%s'></ip>" % (address, netmask)
+        # Built directly, there is nothing to gain from parsing a string.
+        # Values are formatted like in the XML strings used before, any
+        # object (prefix length, ipaddress instance) becomes its str().
+        attrs = {"address": str(address)}
+        if not ipv6:
+            attrs["netmask"] = str(netmask)
+        self.xml = xml_utils.ElementTree.Element("ip", attrs)
 
     @staticmethod
     def marshal_from_hosts(item, index, libvirtxml):
         """
         Convert an xml object to host tag and xml element
         """
-        if isinstance(item, DhcpHostXML):
+        # Plain dicts are the common case, they fail the class check anyway
+        if type(item) is not dict and isinstance(item, DhcpHostXML):
             return "host", item
         elif isinstance(item, dict):
             host = DhcpHostXML()
@@ -144,7 +353,8 @@ class IPXML(base.LibvirtXMLBase):
             return "host", host
         else:
             raise xcepts.LibvirtXMLError(
-                "Expected a list of ip dhcp host " "instances, not a %s" % str(item)
+                "Expected a list of ip dhcp host "
+                "instances, not a %s" % type(item).__name__
             )
 
     @staticmethod
@@ -158,6 +368,34 @@ class IPXML(base.LibvirtXMLBase):
         newone.xmltreefile = new_treefile
         return newone
 
+    def set_dhcp_ranges_fast(self, ranges):
+        """
+        Replace all dhcp range elements at once, writing the XML only once
+
+        Unlike the dhcp_ranges property, no RangeXML instance is created
+        per range, which matters for networks with large DHCP pools.
+
+        :param ranges: iterable of two-item (start, end) address tuples
+        """
+        range_list = RangeList(ranges)
+        xmltreefile = self.__dict_get__("xml")
+        dhcp = xmltreefile.find("dhcp")
+        if dhcp is None:
+            dhcp = xml_utils.ElementTree.SubElement(xmltreefile.getroot(), "dhcp")
+        children = list(dhcp)
+        # New ranges go where the old ones were, or first like libvirt
+        # writes them, ahead of any host or bootp element
+        index = 0
+        for position, element in enumerate(children):
+            if element.tag == "range":
+                index = position
+                break
+        others = [element for element in children if element.tag != "range"]
+        new_ranges = xml_utils.ElementTree.Element("dhcp")
+        range_list.append_to_element(new_ranges)
+        dhcp[:] = others[:index] + list(new_ranges) + others[index:]
+        xmltreefile.write()
+
 
 # Sub-element of ip/dhcp
 class DhcpHostXML(base.LibvirtXMLBase):
@@ -174,7 +412,7 @@ class DhcpHostXML(base.LibvirtXMLBase):
             "lease_attrs", self, parent_xpath="/", tag_name="lease"
         )
         super(DhcpHostXML, self).__init__(virsh_instance=virsh_instance)
-        self.xml = "<host/>"
+        self.xml = xml_utils.ElementTree.Element("host")
 
 
 class DNSXML(base.LibvirtXMLBase):
@@ -215,6 +453,7 @@ class DNSXML(base.LibvirtXMLBase):
             parent_xpath="/",
             marshal_from=self.marshal_from_forwarder,
             marshal_to=self.marshal_to_forwarder,
+            marshal_tags=("forwarder",),
         )
         accessors.XMLAttribute(
             "dns_forward",
@@ -232,7 +471,7 @@ class DNSXML(base.LibvirtXMLBase):
             subclass_dargs={"virsh_instance": virsh_instance},
         )
         super(DNSXML, self).__init__(virsh_instance=virsh_instance)
-        self.xml = "<dns></dns>"
+        self.xml = xml_utils.ElementTree.Element("dns")
 
     class HostnameXML(base.LibvirtXMLBase):
         """
@@ -249,7 +488,7 @@ class DNSXML(base.LibvirtXMLBase):
                 "hostname", self, parent_xpath="/", tag_name="hostname"
             )
             super(DNSXML.HostnameXML, self).__init__(virsh_instance=virsh_instance)
-            self.xml = "<hostname/>"
+            self.xml = xml_utils.ElementTree.Element("hostname")
 
     class HostXML(base.LibvirtXMLBase):
         """
@@ -275,16 +514,17 @@ class DNSXML(base.LibvirtXMLBase):
                 marshal_from=self.marshal_from_hostname,
                 marshal_to=self.marshal_to_hostname,
                 has_subclass=True,
+                marshal_tags=("hostname",),
             )
             super(DNSXML.HostXML, self).__init__(virsh_instance=virsh_instance)
-            self.xml = "<host/>"
+            self.xml = xml_utils.ElementTree.Element("host")
 
         @staticmethod
         def marshal_from_hostname(item, index, libvirtxml):
             """
             Convert an HostnameXML object to hostname tag and xml element.
             """
-            if isinstance(item, DNSXML.HostnameXML):
+            if type(item) is not dict and isinstance(item, DNSXML.HostnameXML):
                 return "hostname", item
             elif isinstance(item, (dict, str)):
                 hostname = DNSXML.HostnameXML()
@@ -295,7 +535,8 @@ class DNSXML(base.LibvirtXMLBase):
                 return "hostname", hostname
             else:
                 raise xcepts.LibvirtXMLError(
-                    "Expected a list of HostnameXML " "instances, not a %s" % str(item)
+                    "Expected a list of HostnameXML "
+                    "instances, not a %s" % type(item).__name__
                 )
 
         @staticmethod
@@ -314,8 +555,9 @@ class DNSXML(base.LibvirtXMLBase):
         Return a new disk IOTune instance and set properties from dargs
         """
         new_one = DNSXML.HostXML(virsh_instance=self.virsh)
-        for key, value in list(dargs.items()):
-            setattr(new_one, key, value)
+        with new_one.batch_writes():
+            for key, value in dargs.items():
+                setattr(new_one, key, value)
         return new_one
 
     @staticmethod
@@ -325,9 +567,10 @@ class DNSXML(base.LibvirtXMLBase):
         del libvirtxml  # not used
         if not isinstance(item, dict):
             raise xcepts.LibvirtXMLError(
-                "Expected a dictionary of host " "attributes, not a %s" % str(item)
+                "Expected a dictionary of host "
+                "attributes, not a %s" % type(item).__name__
             )
-        return ("forwarder", dict(item))  # return copy of dict, not reference
+        return ("forwarder", _marshal_dict(item))
 
     @staticmethod
     def marshal_to_forwarder(tag, attr_dict, index, libvirtxml):
@@ -336,7 +579,7 @@ class DNSXML(base.LibvirtXMLBase):
         del libvirtxml  # not used
         if tag != "forwarder":
             return None  # skip this one
-        return dict(attr_dict)  # return copy of dict, not reference
+        return _marshal_dict(attr_dict)
 
 
 class PortgroupXML(base.LibvirtXMLBase):
@@ -396,7 +639,7 @@ class PortgroupXML(base.LibvirtXMLBase):
         )
         accessors.XMLElementDict("vlan_tag", self, parent_xpath="/vlan", tag_name="tag")
         super(PortgroupXML, self).__init__(virsh_instance=virsh_instance)
-        self.xml = "<portgroup></portgroup>"
+        self.xml = xml_utils.ElementTree.Element("portgroup")
 
 
 class NetworkXMLBase(base.LibvirtXMLBase):
@@ -514,6 +757,8 @@ class NetworkXMLBase(base.LibvirtXMLBase):
     __schema_name__ = "network"
 
     def __init__(self, virsh_instance=base.virsh):
+        # Not a property, see _state_cache()
+        self.__super_set__("_net_state_cache", None)
         accessors.XMLAttribute(
             "connection",
             self,
@@ -533,6 +778,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             marshal_from=self.marshal_from_ips,
             marshal_to=self.marshal_to_ips,
             has_subclass=True,
+            marshal_tags=("ip",),
         )
         accessors.XMLElementDict("forward", self, parent_xpath="/", tag_name="forward")
         accessors.XMLElementList(
@@ -541,6 +787,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             parent_xpath="/forward",
             marshal_from=self.marshal_from_forward_iface,
             marshal_to=self.marshal_to_forward_iface,
+            marshal_tags=("interface",),
         )
         accessors.XMLElementDict(
             "nat_attrs", self, parent_xpath="/forward", tag_name="nat"
@@ -552,6 +799,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             marshal_from=self.marshal_from_address,
             marshal_to=self.marshal_to_address,
             has_subclass=True,
+            marshal_tags=("address",),
         )
         accessors.XMLElementDict("driver", self, parent_xpath="/", tag_name="driver")
         accessors.XMLElementDict("pf", self, parent_xpath="/forward", tag_name="pf")
@@ -581,6 +829,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             marshal_from=self.marshal_from_portgroups,
             marshal_to=self.marshal_to_portgroups,
             has_subclass=True,
+            marshal_tags=("portgroup",),
         )
         accessors.XMLElementNest(
             "dns",
@@ -596,6 +845,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             parent_xpath="/",
             marshal_from=self.marshal_from_route,
             marshal_to=self.marshal_to_route,
+            marshal_tags=("route",),
         )
         accessors.XMLAttribute(
             "virtualport_type",
@@ -613,17 +863,18 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """
         Convert an xml object to address tag and xml element.
         """
-        if isinstance(item, librarian.get("address")):
+        if type(item) is not dict and isinstance(item, NetworkXMLBase.Address):
             return "address", item
         elif isinstance(item, dict):
-            address = librarian.get("address")("pci", virsh_instance=libvirtxml.virsh)
+            address = NetworkXMLBase.Address("pci", virsh_instance=libvirtxml.virsh)
             if "type_name" in item.keys():
                 item.pop("type_name")
             address.setup_attrs(**item)
             return "address", address
         else:
             raise xcepts.LibvirtXMLError(
-                "Expected a list of address " "instances, not a %s" % str(item)
+                "Expected a list of address "
+                "instances, not a %s" % type(item).__name__
             )
 
     @staticmethod
@@ -633,10 +884,68 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """
         if tag != "address":
             return None  # Don't convert this item
-        newone = librarian.get("address")("pci", virsh_instance=libvirtxml.virsh)
+        newone = NetworkXMLBase.Address("pci", virsh_instance=libvirtxml.virsh)
         newone.xmltreefile = new_treefile
         return newone
 
+    @contextlib.contextmanager
+    def _state_cache(self):
+        """
+        Reuse net_state_dict() results for the duration of the context
+
+        Every state query shells out to 'virsh net-list', so accessors making
+        several of them for one logical operation run inside this context.
+        Mutating virsh calls drop the cached results, see _state_changed().
+        """
+        if self.__super_get__("_net_state_cache") is not None:
+            yield  # Nested, the outer context owns the cache
+            return
+        self.__super_set__("_net_state_cache", {})
+        try:
+            yield
+        finally:
+            self.__super_set__("_net_state_cache", None)
+
+    def _state_changed(self):
+        """Drop cached net_state_dict() results and uuids after state changed"""
+        # A network redefined under the same name may have a new uuid
+        _UUID_CACHE.clear()
+        _NAMES_CACHE.clear()
+        cache = self.__super_get__("_net_state_cache")
+        if cache is not None:
+            cache.clear()
+
+    def _net_state_dict(self, only_names=False):
+        """
+        Return virsh.net_state_dict() result, cached inside _state_cache()
+
+        :param only_names: When true, return network names as keys and None values
+        """
+        cache = self.__super_get__("_net_state_cache")
+        if cache is not None:
+            if only_names in cache:
+                return cache[only_names]
+            # Name lookups are satisfied by an already parsed full state
+            # table, but a presence check alone never pays for parsing it.
+            if only_names and False in cache:
+                return cache[False]
+        state_dict = None
+        conn = _libvirt_conn(self.virsh)
+        if conn is not None:
+            try:
+                state_dict = _libvirt_net_state_dict(conn, only_names)
+            except libvirt.libvirtError:
+                pass  # Let virsh report the problem
+        if state_dict is None and only_names:
+            names = self.virsh.net_list_names(virsh_instance=self.virsh)
+            state_dict = dict.fromkeys(names)
+        elif state_dict is None:
+            params = {"only_names": only_names, "virsh_instance": self.virsh}
+            state_dict = self.virsh.net_state_dict(**params)
+        if cache is not None:
+            cache[only_names] = state_dict
+        return state_dict
+
     def __check_undefined__(self, errmsg):
         if not self.defined:
             raise xcepts.LibvirtXMLError(errmsg)
@@ -645,8 +954,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """
         Accessor for 'define' property - does this name exist in network list
         """
-        params = {"only_names": True, "virsh_instance": self.virsh}
-        return self.name in self.virsh.net_state_dict(**params)
+        return self.name in self._net_state_dict(only_names=True)
 
     def set_defined(self, value):
         """Accessor method for 'define' property, set True to define."""
@@ -655,6 +963,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         value = bool(value)
         if value:
             self.virsh.net_define(self.xml)  # send it the filename
+            self._state_changed()
         else:
             del self.defined
 
@@ -662,10 +971,11 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """Accessor method for 'define' property, undefines network"""
         self.__check_undefined__("Cannot undefine non-existant network")
         self.virsh.net_undefine(self.name)
+        self._state_changed()
 
     def get_active(self):
         """Accessor method for 'active' property (True/False)"""
-        state_dict = self.virsh.net_state_dict(virsh_instance=self.virsh)
+        state_dict = self._net_state_dict()
         try:
             active_state = state_dict[self.name]["active"]
         except KeyError:
@@ -676,58 +986,67 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """Accessor method for 'active' property, sets network active"""
         if not self.__super_get__("INITIALIZED"):
             pass  # do nothing
-        self.__check_undefined__("Cannot activate undefined network")
-        value = bool(value)
-        if value:
-            if not self.active:
-                self.virsh.net_start(self.name)
-            else:
-                pass  # don't activate twice
-        else:
-            if self.active:
-                del self.active
+        with self._state_cache():
+            self.__check_undefined__("Cannot activate undefined network")
+            value = bool(value)
+            if value:
+                if not self.active:
+                    self.virsh.net_start(self.name)
+                    self._state_changed()
+                else:
+                    pass  # don't activate twice
             else:
-                pass  # don't deactivate twice
+                if self.active:
+                    del self.active
+                else:
+                    pass  # don't deactivate twice
 
     def del_active(self):
         """Accessor method for 'active' property, stops network"""
         if self.active:
             self.virsh.net_destroy(self.name)
+            self._state_changed()
         else:
             pass  # don't destroy twice
 
     def get_autostart(self):
         """Accessor method for 'autostart' property, True if set"""
-        self.__check_undefined__("Cannot determine autostart for undefined " "network")
-        state_dict = self.virsh.net_state_dict(virsh_instance=self.virsh)
+        with self._state_cache():
+            self.__check_undefined__(
+                "Cannot determine autostart for undefined " "network"
+            )
+            state_dict = self._net_state_dict()
         return state_dict[self.name]["autostart"]
 
     def set_autostart(self, value):
         """Accessor method for 'autostart' property, sets/unsets autostart"""
         if not self.__super_get__("INITIALIZED"):
             pass  # do nothing
-        self.__check_undefined__("Cannot set autostart for undefined network")
-        value = bool(value)
-        if value:
-            if not self.autostart:
-                self.virsh.net_autostart(self.name)
-            else:
-                pass  # don't set autostart twice
-        else:
-            if self.autostart:
-                del self.autostart
+        with self._state_cache():
+            self.__check_undefined__("Cannot set autostart for undefined network")
+            value = bool(value)
+            if value:
+                if not self.autostart:
+                    self.virsh.net_autostart(self.name)
+                    self._state_changed()
+                else:
+                    pass  # don't set autostart twice
             else:
-                pass  # don't unset autostart twice
+                if self.autostart:
+                    del self.autostart
+                else:
+                    pass  # don't unset autostart twice
 
     def del_autostart(self):
         """Accessor method for 'autostart' property, unsets autostart"""
         if not self.defined:
             raise xcepts.LibvirtXMLError("Can't autostart nonexistant network")
         self.virsh.net_autostart(self.name, "--disable")
+        self._state_changed()
 
     def get_persistent(self):
         """Accessor method for 'persistent' property"""
-        state_dict = self.virsh.net_state_dict(virsh_instance=self.virsh)
+        state_dict = self._net_state_dict()
         return state_dict[self.name]["persistent"]
 
     # Copy behavior for consistency
@@ -735,12 +1054,21 @@ class NetworkXMLBase(base.LibvirtXMLBase):
     del_persistent = del_defined
 
     def add_ip(self, value):
-        if not issubclass(type(value), IPXML):
-            raise xcepts.LibvirtXMLError("value must be a IPXML or subclass")
+        self.add_ips([value])
+
+    def add_ips(self, values):
+        """
+        Append ip elements from IPXML instances, writing the XML only once
+
+        :param values: iterable of IPXML instances
+        """
+        values = list(values)
+        for value in values:
+            if not isinstance(value, IPXML):
+                raise xcepts.LibvirtXMLError("value must be a IPXML or subclass")
         xmltreefile = self.__dict_get__("xml")
         # IPXML root element is whole IP element tree
-        root = xmltreefile.getroot()
-        root.append(value.xmltreefile.getroot())
+        xmltreefile.getroot().extend(value.xmltreefile.getroot() for value in values)
         xmltreefile.write()
 
     def del_element(self, element="", index=0):
@@ -751,12 +1079,20 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         :param index: index of element that want to delete
         """
         xmltreefile = self.__dict_get__("xml")
-        try:
-            del_elem = xmltreefile.findall(element)[index]
-        except IndexError as detail:
-            del_elem = None
-            LOG.warning(detail)
-        if del_elem is not None:
+        xpath = _relative_xpath(element)
+        if index == 0:
+            # The usual case, find() stops at the first match
+            del_elem = xmltreefile.find(xpath)
+        else:
+            try:
+                del_elem = xmltreefile.findall(xpath)[index]
+            except IndexError:
+                del_elem = None
+        if del_elem is None:
+            # Deleting an optional element that isn't there is common
+            if LOG.isEnabledFor(logging.WARNING):
+                LOG.warning("del_element(%s)[%d]: no such element", element, index)
+        else:
             xmltreefile.remove(del_elem)
             xmltreefile.write()
 
@@ -765,7 +1101,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """
         Convert an xml object to ip tag and xml element.
         """
-        if isinstance(item, IPXML):
+        if type(item) is not dict and isinstance(item, IPXML):
             return "ip", item
         elif isinstance(item, dict):
             ip = IPXML()
@@ -777,7 +1113,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             return "ip", ip
         else:
             raise xcepts.LibvirtXMLError(
-                "Expected a list of IPXML " "instances, not a %s" % str(item)
+                "Expected a list of IPXML " "instances, not a %s" % type(item).__name__
             )
 
     @staticmethod
@@ -796,7 +1132,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         """
         Convert an xml object to portgroup tag and xml element.
         """
-        if isinstance(item, PortgroupXML):
+        if type(item) is not dict and isinstance(item, PortgroupXML):
             return "portgroup", item
         elif isinstance(item, dict):
             portgroup = PortgroupXML()
@@ -804,7 +1140,8 @@ class NetworkXMLBase(base.LibvirtXMLBase):
             return "portgroup", portgroup
         else:
             raise xcepts.LibvirtXMLError(
-                "Expected a list of PortgroupXML " "instances, not a %s" % str(item)
+                "Expected a list of PortgroupXML "
+                "instances, not a %s" % type(item).__name__
             )
 
     @staticmethod
@@ -820,7 +1157,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
 
     def get_interface_connection(self):
         try:
-            ifaces = self.xmltreefile.findall("/forward/interface")
+            ifaces = self.xmltreefile.findall("./forward/interface")
         except KeyError as detail:
             raise xcepts.LibvirtXMLError(detail)
         iface_conn = []
@@ -836,8 +1173,9 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         Return a new dns instance and set properties from dargs
         """
         new_one = DNSXML(virsh_instance=self.virsh)
-        for key, value in list(dargs.items()):
-            setattr(new_one, key, value)
+        with new_one.batch_writes():
+            for key, value in dargs.items():
+                setattr(new_one, key, value)
         return new_one
 
     @staticmethod
@@ -847,9 +1185,10 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         del libvirtxml  # not used
         if not isinstance(item, dict):
             raise xcepts.LibvirtXMLError(
-                "Expected a dictionary of interface " "attributes, not a %s" % str(item)
+                "Expected a dictionary of interface "
+                "attributes, not a %s" % type(item).__name__
             )
-        return ("interface", dict(item))  # return copy of dict, not reference
+        return ("interface", _marshal_dict(item))
 
     @staticmethod
     def marshal_to_forward_iface(tag, attr_dict, index, libvirtxml):
@@ -858,7 +1197,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         del libvirtxml  # not used
         if tag != "interface":
             return None  # skip this one
-        return dict(attr_dict)  # return copy of dict, not reference
+        return _marshal_dict(attr_dict)
 
     @staticmethod
     def marshal_from_route(item, index, libvirtxml):
@@ -867,9 +1206,10 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         del libvirtxml  # not used
         if not isinstance(item, dict):
             raise xcepts.LibvirtXMLError(
-                "Expected a dictionary of interface " "attributes, not a %s" % str(item)
+                "Expected a dictionary of interface "
+                "attributes, not a %s" % type(item).__name__
             )
-        return ("route", dict(item))  # return copy of dict, not reference
+        return ("route", _marshal_dict(item))
 
     @staticmethod
     def marshal_to_route(tag, attr_dict, index, libvirtxml):
@@ -878,7 +1218,7 @@ class NetworkXMLBase(base.LibvirtXMLBase):
         del libvirtxml  # not used
         if tag != "route":
             return None  # skip this one
-        return dict(attr_dict)  # return copy of dict, not reference
+        return _marshal_dict(attr_dict)
 
 
 class NetworkXML(NetworkXMLBase):
@@ -888,12 +1228,17 @@ class NetworkXML(NetworkXMLBase):
 
     __slots__ = []
 
-    def __init__(self, network_name="default", virsh_instance=base.virsh):
+    def __init__(
+        self, network_name="default", virsh_instance=base.virsh, _skip_init_xml=False
+    ):
         """
         Initialize new instance with empty XML
+
+        :param _skip_init_xml: Leave XML unset, for callers about to set it
         """
         super(NetworkXML, self).__init__(virsh_instance=virsh_instance)
-        self.xml = "<network><name>%s</name></network>" % network_name
+        if not _skip_init_xml:
+            self.xml = "<network><name>%s</name></network>" % network_name
 
     @staticmethod  # wraps __new__
     def new_all_networks_dict(virsh_instance=base.virsh):
@@ -903,16 +1248,49 @@ class NetworkXML(NetworkXMLBase):
         :param virsh: virsh module or instance to use
         :return: Dictionary of network name to NetworkXML instance
         """
+        conn = _libvirt_conn(virsh_instance)
+        if conn is not None:
+            try:
+                return NetworkXML.new_all_networks_dict_fast(conn, virsh_instance)
+            except libvirt.libvirtError:
+                pass  # Let virsh report the problem
         result = {}
-        # Values should all share virsh property
-        new_netxml = NetworkXML(virsh_instance=virsh_instance)
-        params = {"only_names": True, "virsh_instance": virsh_instance}
-        networks = list(new_netxml.virsh.net_state_dict(**params).keys())
+        networks = virsh_instance.net_list_names(virsh_instance=virsh_instance)
+        # One virsh call for all networks instead of one each
+        net_xmls = virsh_instance.net_dumpxml_batch(
+            networks, virsh_instance=virsh_instance
+        )
         for net_name in networks:
-            new_copy = new_netxml.copy()
-            dump_result = virsh_instance.net_dumpxml(net_name)
-            new_copy.xml = dump_result.stdout_text.strip()
-            result[net_name] = new_copy
+            # Values should all share virsh property, XML is parsed only once
+            new_netxml = NetworkXML(virsh_instance=virsh_instance, _skip_init_xml=True)
+            new_netxml.xml = net_xmls[net_name]
+            result[net_name] = new_netxml
+        return result
+
+    @staticmethod  # wraps __new__
+    def new_all_networks_dict_fast(conn=None, virsh_instance=base.virsh):
+        """
+        Return new_all_networks_dict() result from libvirt python bindings
+
+        All networks and their XML come from one connection, without
+        starting any virsh process.
+
+        :param conn: libvirt connection, None to open one for virsh_instance
+        :param virsh_instance: virsh module or instance to use
+        :return: Dictionary of network name to NetworkXML instance
+        :raise: LibvirtXMLError if no libvirt connection is available
+        """
+        if conn is None:
+            conn = _libvirt_conn(virsh_instance)
+            if conn is None:
+                raise xcepts.LibvirtXMLError(
+                    "No libvirt python bindings connection available"
+                )
+        result = {}
+        for net in sorted(conn.listAllNetworks(0), key=lambda net: net.name()):
+            new_netxml = NetworkXML(virsh_instance=virsh_instance, _skip_init_xml=True)
+            new_netxml.xml = net.XMLDesc(0)
+            result[net.name()] = new_netxml
         return result
 
     @staticmethod
@@ -924,9 +1302,8 @@ class NetworkXML(NetworkXMLBase):
         :param virsh_instance: virsh module or instance to use
         :return: New initialized NetworkXML instance
         """
-        netxml = NetworkXML(virsh_instance=virsh_instance)
-        dump_result = virsh_instance.net_dumpxml(network_name, extra)
-        netxml["xml"] = dump_result.stdout_text.strip()
+        netxml = NetworkXML(virsh_instance=virsh_instance, _skip_init_xml=True)
+        netxml["xml"] = _net_dumpxml(network_name, virsh_instance, extra)
         return netxml
 
     @staticmethod
@@ -934,18 +1311,45 @@ class NetworkXML(NetworkXMLBase):
         """
         Return Network's uuid by Network's name.
 
+        Results are cached until a network is changed through NetworkXML,
+        see clear_uuid_cache() for networks changed by other means.
+
         :param network_name: Network's name
         :return: Network's uuid
         """
-        network_xml = NetworkXML.new_from_net_dumpxml(network_name, virsh_instance)
-        return network_xml.uuid
+        key = _uuid_cache_key(network_name, virsh_instance)
+        try:
+            # Move hits to the end, so the least recently used go first
+            uuid = _UUID_CACHE[key] = _UUID_CACHE.pop(key)
+            return uuid
+        except KeyError:
+            pass
+        # Only the uuid is needed, don't build a NetworkXML for it
+        uuid = _scan_tag(_net_dumpxml(network_name, virsh_instance), "uuid")
+        if uuid is None:
+            raise xcepts.LibvirtXMLNotFoundError(
+                "No uuid found in XML of network %s" % network_name
+            )
+        if len(_UUID_CACHE) >= UUID_CACHE_SIZE:
+            del _UUID_CACHE[next(iter(_UUID_CACHE))]
+        _UUID_CACHE[key] = uuid
+        return uuid
+
+    @staticmethod
+    def clear_uuid_cache():
+        """
+        Forget all uuids cached by get_uuid_by_name()
+        """
+        _UUID_CACHE.clear()
 
     def debug_xml(self):
         """
         Dump contents of XML file for debugging
         """
-        xml = str(self)  # LibvirtXMLBase.__str__ returns XML content
-        for debug_line in str(xml).splitlines():
+        if not LOG.isEnabledFor(logging.DEBUG):
+            return
+        # LibvirtXMLBase.__str__ returns XML content
+        for debug_line in str(self).splitlines():
             LOG.debug("Network XML: %s", debug_line)
 
     def state_dict(self):
@@ -955,14 +1359,16 @@ class NetworkXML(NetworkXMLBase):
         :return: A dict contains active/autostart/persistent as keys
                  and boolean as values or None if network doesn't exist.
         """
-        if self.defined:
-            return self.virsh.net_state_dict(virsh_instance=self.virsh)[self.name]
+        with self._state_cache():
+            if self.defined:
+                return self._net_state_dict()[self.name]
 
     def create(self, **dargs):
         """
         Adds non-persistant / transient network to libvirt with net-create
         """
         cmd_result = self.virsh.net_create(self.xml, **dargs)
+        self._state_changed()
         if cmd_result.exit_status:
             raise xcepts.LibvirtXMLError(
                 "Failed to create transient network %s.\n"
@@ -971,21 +1377,83 @@ class NetworkXML(NetworkXMLBase):
 
     def orbital_nuclear_strike(self):
         """It's the only way to really be sure.  Remove all libvirt state"""
-        try:
-            self["active"] = False  # deactivate (stop) network if active
-        except xcepts.LibvirtXMLError as detail:
-            # inconsequential, network will be removed
-            LOG.warning(detail)
-        try:
-            self["defined"] = False  # undefine (delete) network if persistent
-        except xcepts.LibvirtXMLError as detail:
+        current = self.state_dict()
+        if current is None:
             # network already gone
-            LOG.warning(detail)
+            LOG.warning("Cannot remove non-existant network %s", self.name)
+            return
+        # deactivate (stop) network if active, undefine (delete) if persistent
+        result = self._virsh_batch(self._teardown_commands(current))
+        if result.exit_status:
+            LOG.warning(result.stderr_text)
+
+    def _teardown_commands(self, state):
+        """
+        Return virsh commands removing network in state from libvirt
+
+        :param state: state_dict() of the network
+        """
+        commands = []
+        if state["active"]:
+            commands.append("net-destroy %s" % self.name)
+        if state["persistent"]:
+            commands.append("net-undefine %s" % self.name)
+        return commands
+
+    def _check_batch_state(self, expected, result):
+        """
+        Raise LibvirtXMLError unless network ended up in expected state
+
+        virsh only reports the exit status of the last command of a batch,
+        so the outcome of the whole batch is checked on the network itself.
+
+        :param expected: state_dict() expected after the batch
+        :param result: CmdResult of the batch, for error detail
+        """
+        actual = self.state_dict()
+        if actual != expected:
+            raise xcepts.LibvirtXMLError(
+                "Failed to sync network %s, state is %s instead of %s.\n"
+                "Detail: %s" % (self.name, actual, expected, result.stderr_text)
+            )
+
+    def _virsh_batch(self, commands):
+        """
+        Run virsh commands changing network state with one virsh call
+
+        :param commands: list of virsh command strings
+        :return: CmdResult object
+        """
+        result = self.virsh.batch(commands)
+        self._state_changed()
+        return result
 
     def exists(self):
         """
         Return True if network already exists.
+
+        Network names are cached for NAMES_CACHE_TTL seconds, or until a
+        network is changed through NetworkXML.
         """
+        key = _connection_key(self.virsh)
+        cached = _NAMES_CACHE.get(key)
+        if cached is not None and time.monotonic() - cached[0] < NAMES_CACHE_TTL:
+            return self.name in cached[1]
+        names = None
+        conn = _libvirt_conn(self.virsh)
+        if conn is not None:
+            try:
+                # Unlike looking up a missing network, listing doesn't fail
+                names = frozenset(_libvirt_net_state_dict(conn, only_names=True))
+            except libvirt.libvirtError:
+                pass  # Let virsh answer
+        if names is None:
+            cmd_result = self.virsh.net_list("--all --name", ignore_status=True)
+            if not cmd_result.exit_status:
+                names = frozenset(cmd_result.stdout_text.split())
+        if names is not None:
+            _NAMES_CACHE[key] = (time.monotonic(), names)
+            return self.name in names
         cmd_result = self.virsh.net_uuid(self.name)
         return cmd_result.exit_status == 0
 
@@ -993,8 +1461,12 @@ class NetworkXML(NetworkXMLBase):
         """
         Undefine network witch name is self.name.
         """
-        self.virsh.net_destroy(self.name)
-        cmd_result = self.virsh.net_undefine(self.name)
+        commands = ["net-undefine %s" % self.name]
+        if self.active:
+            # Destroying an inactive network only fails noisily
+            commands.insert(0, "net-destroy %s" % self.name)
+        # Exit status is the one of net-undefine, run last
+        cmd_result = self._virsh_batch(commands)
         if cmd_result.exit_status:
             raise xcepts.LibvirtXMLError(
                 "Failed to undefine network %s.\n"
@@ -1006,6 +1478,7 @@ class NetworkXML(NetworkXMLBase):
         Define network from self.xml.
         """
         cmd_result = self.virsh.net_define(self.xml)
+        self._state_changed()
         if cmd_result.exit_status:
             raise xcepts.LibvirtXMLError(
                 "Failed to define network %s.\n"
@@ -1017,6 +1490,7 @@ class NetworkXML(NetworkXMLBase):
         Start network with self.virsh.
         """
         cmd_result = self.virsh.net_start(self.name, debug=True)
+        self._state_changed()
         if cmd_result.exit_status:
             raise xcepts.LibvirtXMLError(
                 "Failed to start network %s.\n"
@@ -1031,19 +1505,33 @@ class NetworkXML(NetworkXMLBase):
         :param state: a boolean dict contains active/persistent/autostart as
                       keys
         """
-        if self["defined"]:
-            if self["active"]:
-                del self["active"]
-            if self["defined"]:
-                del self["defined"]
-
-        self["defined"] = True
-        if state:
-            self["active"] = state["active"]
-            if not state["persistent"]:
-                del self["persistent"]
-            if self.defined:
-                self["autostart"] = state["autostart"]
-        else:
-            self["active"] = True
-            self["autostart"] = True
+        if not state:
+            state = {"active": True, "persistent": True, "autostart": True}
+        with self._state_cache():
+            # An existing network is always torn down completely, then set
+            # up with only the commands the designated state needs
+            current = self.state_dict()
+            if current is not None:
+                # Redefining is what makes the new XML take effect
+                result = self._virsh_batch(self._teardown_commands(current))
+                self._check_batch_state(None, result)
+
+            if state["active"] and not state["persistent"]:
+                # Transient network can't set autostart
+                commands = ["net-create %s" % self.xml]
+            elif state["persistent"]:
+                # Newly defined network is inactive without autostart
+                commands = ["net-define %s" % self.xml]
+                if state["active"]:
+                    commands.append("net-start %s" % self.name)
+                if state["autostart"]:
+                    commands.append("net-autostart %s" % self.name)
+            else:
+                return  # Designated state is no network at all
+            result = self._virsh_batch(commands)
+            expected = {
+                "active": state["active"],
+                "persistent": state["persistent"],
+                "autostart": state["autostart"] and state["persistent"],
+            }
+            self._check_batch_state(expected, result)
@@ -22,6 +22,7 @@ for non-existant keys.
 """
 
 import base64
+import concurrent.futures
 import inspect
 import locale
 import logging
@@ -874,6 +875,26 @@ def command(cmd, **dargs):
     return ret
 
 
+def batch(commands, **dargs):
+    """
+    Run several virsh commands with a single virsh invocation
+
+    virsh carries on with the next command when one fails and exits with
+    the status of the last one, errors of all commands end up in stderr.
+
+    :param commands: list of virsh command strings, e.g. "net-start default"
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object
+    """
+    cmd = " ; ".join(commands)
+    if not dargs.get("session_id"):
+        # One shell argument for virsh to split, interactive sessions get
+        # the string as is. Double quotes (not shlex.quote) so it still
+        # nests in the single quoted 'su -c' of unprivileged users.
+        cmd = '"%s"' % re.sub(r'(["$`\\])', r"\\\1", cmd)
+    return command(cmd, **dargs)
+
+
 def domname(dom_id_or_uuid, **dargs):
     """
     Convert a domain id or UUID to domain name
@@ -2099,6 +2120,70 @@ def net_dumpxml(name, extra="", to_file="", **dargs):
     return result
 
 
+def net_dumpxml_batch(names, extra="", virsh_instance=None, **dargs):
+    """
+    Dump XML of several networks with a single virsh invocation.
+
+    The net-dumpxml commands are run by one virsh process, separated by
+    echoed marker lines. Networks without output in the batch (e.g. an
+    older virsh which can't run it) are dumped again one by one, by up
+    to $VIRSH_DUMPXML_WORKERS (default 16) concurrent virsh processes.
+
+    :param names: Names of networks
+    :param extra: Extra parameters to pass to each net-dumpxml command
+    :param virsh_instance: Call net_dumpxml() on this instance instead of
+                           module for networks dumped one by one
+    :param dargs: standardized virsh function API keywords
+    :return: dictionary of network name to XML string
+    """
+    marker = "@net-dumpxml@ "
+    cmds = []
+    for name in names:
+        cmds.append("echo %s%s" % (marker, name))
+        cmds.append("net-dumpxml %s %s" % (name, extra))
+    result = {}
+    if cmds:
+        batch_dargs = dict(dargs)
+        batch_dargs["ignore_status"] = True  # Failures retried below
+        output = batch(cmds, **batch_dargs).stdout_text
+        name = None
+        for line in output.splitlines():
+            if line.startswith(marker):
+                name = line[len(marker) :]
+                result[name] = []
+            elif name is not None:
+                result[name].append(line)
+        result = dict(
+            (name, "\n".join(lines).strip()) for name, lines in result.items()
+        )
+    missing = [name for name in names if not result.get(name)]
+    if virsh_instance is not None:
+        dumpxml = virsh_instance.net_dumpxml
+    else:
+        dumpxml = net_dumpxml
+
+    def _dump(name):
+        return dumpxml(name, extra, **dargs).stdout_text.strip()
+
+    # Independent read-only calls, run them concurrently unless they
+    # have to share one interactive session
+    try:
+        workers = int(os.environ.get("VIRSH_DUMPXML_WORKERS", 16))
+    except ValueError:
+        LOG.warning(
+            "Ignoring invalid VIRSH_DUMPXML_WORKERS=%r, using 16",
+            os.environ["VIRSH_DUMPXML_WORKERS"],
+        )
+        workers = 16
+    workers = min(workers, len(missing))
+    if workers > 1 and not dargs.get("session_id"):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            result.update(zip(missing, executor.map(_dump, missing)))
+    else:
+        result.update((name, _dump(name)) for name in missing)
+    return result
+
+
 def net_create(xml_file, extra="", **dargs):
     """
     Create _transient_ network from a XML file.
@@ -2135,6 +2220,28 @@ def net_list(options, extra="", **dargs):
     return command("net-list %s %s" % (options, extra), **dargs)
 
 
+def net_list_names(virsh_instance=None, **dargs):
+    """
+    Return names of all networks on host
+
+    Cheaper than net_state_dict() for callers which don't need the states,
+    falls back to it when virsh doesn't support 'net-list --name'.
+
+    :param virsh_instance: Call net_list() on this instance instead of module
+    :param dargs: standardized virsh function API keywords
+    :return: list of network names
+    """
+    list_dargs = dict(dargs)
+    list_dargs["ignore_status"] = True  # Failures retried below
+    if virsh_instance is not None:
+        net_list_result = virsh_instance.net_list("--all --name", **list_dargs)
+    else:
+        net_list_result = net_list("--all --name", **list_dargs)
+    if net_list_result.exit_status:
+        return list(net_state_dict(True, virsh_instance, **dargs).keys())
+    return net_list_result.stdout_text.split()
+
+
 def net_state_dict(only_names=False, virsh_instance=None, **dargs):
     """
     Return network name to state/autostart/persistent mapping
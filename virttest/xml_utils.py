@@ -36,12 +36,18 @@
     module for examples.
 """
 
+import contextlib
 import io
 import logging
 import os
 import shutil
 import string
 import tempfile
+
+# On python 3 this transparently provides the C accelerated (_elementtree)
+# Element/XMLParser types, cElementTree is only a deprecated alias of it.
+# lxml is not a drop-in replacement: XMLTreeFile subclasses the
+# ElementTree class, which lxml only offers as a factory function.
 from xml.etree import ElementTree
 from xml.parsers import expat
 
@@ -107,6 +113,8 @@ class TempXMLFile(io.FileIO):
         """
         unlink temporary file on instance delete.
         """
+        if not hasattr(self, "name"):
+            return  # __init__ failed before any file was opened
         self.close()
         self.unlink()
 
@@ -170,13 +178,28 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
     # self.sourcefilename inherited from parent
     sourcebackupfile = None
 
+    # Nesting depth of deferred_writes() and whether a write() was skipped
+    _defer_write = 0
+    _write_pending = False
+
     def __init__(self, xml):
         """
         Initialize from a string or filename containing XML source.
 
-        param: xml: A filename or string containing XML
+        param: xml: A filename or string containing XML, or an already
+                    built ElementTree.Element to use as root (not parsed)
         """
-
+        if isinstance(xml, ElementTree.Element):
+            # Serialize first, so an unusable element fails before any
+            # temporary file or backup exists
+            xml_bytes = ElementTree.tostring(xml, ENCODING).encode()
+            self.sourcebackupfile = TempXMLFile()
+            self.sourcebackupfile.write(xml_bytes)
+            self.sourcebackupfile.close()
+            XMLBackup.__init__(self, self.sourcebackupfile.name)
+            ElementTree.ElementTree.__init__(self, element=xml)
+            self.flush()  # make sure it's on-disk
+            return
         # xml param could be xml string or readable filename
         # If it's a string, use auto-delete TempXMLFile
         # to hold the original content.
@@ -210,6 +233,7 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
     def backup(self):
         """Overwrite original source from current tree"""
         self.write()
+        self.sync_deferred_write()
         self.flush()
         # self is the 'original', so backup/restore logic is reversed
         super(XMLTreeFile, self).restore()
@@ -225,6 +249,7 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
 
     def backup_copy(self):
         """Return a copy of instance, including copies of files"""
+        self.sync_deferred_write()
         return self.__class__(self.name)
 
     def reroot(self, xpath):
@@ -330,10 +355,39 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
         """
 
         if filename is None:
+            if self._defer_write:
+                self._write_pending = True
+                return
             filename = self.name
+            self._write_pending = False
         # Avoid calling file.write() by mistake
         ElementTree.ElementTree.write(self, filename, encoding)
 
+    @contextlib.contextmanager
+    def deferred_writes(self):
+        """
+        Collapse all write() calls to self.name within the block into one
+
+        The file is only updated when the outermost block exits, so it
+        must not be read by name in the meantime.  backup_copy(), reroot()
+        and backup() bring it up to date first.
+        """
+        self._defer_write += 1
+        try:
+            yield self
+        finally:
+            self._defer_write -= 1
+            if not self._defer_write and self._write_pending:
+                self.write()
+
+    def sync_deferred_write(self):
+        """
+        Write a change held back by deferred_writes() to self.name now
+        """
+        if self._write_pending:
+            ElementTree.ElementTree.write(self, self.name, ENCODING)
+            self._write_pending = False
+
     def read(self, xml):
         self.__del__()
         self.__init__(xml)